@@ -3,6 +3,7 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver import Chrome, ChromeOptions
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import StaleElementReferenceException
 
 class ChromeDriver(Chrome):
     def __init__(self, driver_path: str = None, headless: bool = True, download_path: str = None):
@@ -48,6 +49,9 @@ class ChromeDriver(Chrome):
         # start window at max size
         options.add_argument("--start-maximized")
 
+        # write shared memory to /tmp, /dev/shm is too small in containers and chrome crashes
+        options.add_argument("--disable-dev-shm-usage")
+
         # init driver
         super().__init__(executable_path=self.driver_path, chrome_options=options)
 
@@ -66,6 +70,12 @@ class ChromeDriver(Chrome):
             EC.staleness_of(element)
         )
 
+    def wait_element_text(self, xpath: str, text: str, wait_time: int = 10):
+        # compare the whole text, text_to_be_present_in_element also matches substrings
+        WebDriverWait(self, wait_time, ignored_exceptions=[StaleElementReferenceException]).until(
+            lambda driver: driver.find_element(By.XPATH, xpath).text.strip() == text
+        )
+
     def get_element(self, xpath: str, wait_time: int = 10):
         element = WebDriverWait(self, wait_time).until(
             EC.presence_of_element_located((By.XPATH, xpath))
@@ -8,11 +8,12 @@ from time import sleep
 from datetime import datetime
 from operator import itemgetter
 from urllib.parse import urljoin
-from bs4 import BeautifulSoup as bs
+from concurrent.futures import ThreadPoolExecutor
+from selectolax.lexbor import LexborHTMLParser
 
 from utils.config import END_YEAR
 from newspaper_config.animal_politico import *
-from utils.methods import get_processed_ids, get_section_checkpoint, get_url, save_processed_ids, save_section_checkpoint, write_to_json_safe
+from utils.methods import get_processed_ids, get_section_checkpoint, get_url, append_processed_ids, drop_processed, save_section_checkpoint, write_to_json_safe
 
 
 # setup loggers
@@ -26,13 +27,23 @@ critical_logs = ["urllib3", "charset_normalizer", "filelock"]
 for logger_name in critical_logs:
     logging.getLogger(logger_name).setLevel(logging.ERROR)
 
+# threads reused by every batch to get the articles' text
+EXECUTOR = ThreadPoolExecutor(max_workers=NUM_THREADS)
+
+# regex used for every article
+REDIRECT_REGEX = re.compile(r"^(Lee|Entérate)( (más|también))? *[:\|]")
+
 
 def get_text(content: str) -> str:
     """
     Get the article's full text
     """
-    soup = bs(content, "lxml")
-    return soup.text
+    tree = LexborHTMLParser(content)
+
+    # scripts and styles aren't part of the text
+    tree.strip_tags(["script", "style"])
+
+    return tree.text()
 
 
 def get_url_text(url: str) -> str:
@@ -46,19 +57,22 @@ def get_url_text(url: str) -> str:
         LOGGER.warning(f"Couldn't get url {url}", exc_info=True)
         return None
 
-    # build bs object
-    soup = bs(response.content, "lxml")
+    # build html tree
+    tree = LexborHTMLParser(response.content)
+
+    # scripts and styles aren't part of the text
+    tree.strip_tags(["script", "style"])
 
     text = ""
-    for post_details in soup.find_all("div", {"class":"post-details"}):
+    for post_details in tree.css("div.post-details"):
         
-        attatchment = post_details.find("figure")
+        attatchment = post_details.css_first("figure")
         if attatchment is not None:
             # section is an attatchment (image, video, tweet)
             continue
         
-        details_text = post_details.text
-        if re.match(r"^(Lee|Entérate)( (más|también))? *[:\|].*", details_text) is not None:
+        details_text = post_details.text()
+        if REDIRECT_REGEX.match(details_text) is not None:
             # text is a redirect to other article
             continue
             
@@ -68,32 +82,55 @@ def get_url_text(url: str) -> str:
     return text
 
 
-def build_url(row: pd.Series) -> str:
+def get_url_text_parallel(url: str) -> str:
     """
-    Build the article's url
+    Wrapper to call the `get_url_text` function in parallel and catch any errors
+
+    Parameters
+    ----------
+    url : str
+        article's url
+
+    Returns
+    -------
+    str
+        text of the article, if there was an error it's None
     """
-    if row.categoryPrimarySlug != "":
-        article_slug = f"{row.section_slug}/{row.categoryPrimarySlug}/{row.slug}"
+    try:
+        return get_url_text(url)
+    except Exception:
+        LOGGER.warning(f"Couldn't get text from {url}", exc_info=True)
+        return None
+
+
+def build_url(article: dict, section_name: str) -> str:
+    """
+    Build the article's url from its raw data
+    """
+    section_slug = section_name.replace("_", "-")
+
+    if article["categoryPrimarySlug"] != "":
+        article_slug = f"{section_slug}/{article['categoryPrimarySlug']}/{article['slug']}"
 
-    elif row.section == "hablemos_de":
+    elif section_name == "hablemos_de":
         # get all the categories
-        section_categories = set(map(itemgetter("slug"), map(itemgetter("node"), row.categorasDeHablemosDe["edges"])))
+        section_categories = set(map(itemgetter("slug"), map(itemgetter("node"), article["categorasDeHablemosDe"]["edges"])))
         # see which of them is a valid subcategory for the url
-        category_slug = SUBCATEGORIES[row.section].intersection(section_categories).pop()
+        category_slug = SUBCATEGORIES[section_name].intersection(section_categories).pop()
         
-        article_slug = f"{row.section_slug}/{category_slug}/{row.slug}"
+        article_slug = f"{section_slug}/{category_slug}/{article['slug']}"
 
-    elif row.section == "analisis":
+    elif section_name == "analisis":
 
-        if row.blogSlug == "blog-invitado":
-            article_slug = f"{row.section_slug}/invitades/{row.slug}"
-        elif row.blogAuthor is None:
-            article_slug = f"{row.section_slug}/autores/{row.blogSlug}/{row.slug}"
+        if article["blogSlug"] == "blog-invitado":
+            article_slug = f"{section_slug}/invitades/{article['slug']}"
+        elif article["blogAuthor"] is None:
+            article_slug = f"{section_slug}/autores/{article['blogSlug']}/{article['slug']}"
         else:
-            article_slug = f"{row.section_slug}/organizaciones/{row.blogSlug}/{row.slug}"
+            article_slug = f"{section_slug}/organizaciones/{article['blogSlug']}/{article['slug']}"
 
     else:
-        article_slug = f"{row.section_slug}/{row.slug}"
+        article_slug = f"{section_slug}/{article['slug']}"
         
     url = urljoin(BASE_URL, article_slug)
     
@@ -116,18 +153,15 @@ def parse_articles(articles: list, section_name: str) -> pd.DataFrame:
     pd.DataFrame
         df with final columns
     """
+    articles = list(articles)
     articles_df = pd.DataFrame(articles)
 
     # set constant columns
     articles_df["newspaper"] = NEWSPAPER_NAME.replace("_", " ")
-    articles_df["section"] = section_name
-    articles_df["section_slug"] = section_name.replace("_", "-")
 
-    # build columns
-    articles_df["url"] = articles_df.apply(build_url, axis=1)
-    articles_df["file_path"] = articles_df.date.apply(
-        lambda d: datetime.strptime(d, "%Y-%m-%dT%H:%M:%S").strftime("%Y/%m.json")
-    )
+    # build columns, the urls come from the raw dicts to avoid building a series per row
+    articles_df["url"] = [build_url(article, section_name) for article in articles]
+    articles_df["file_path"] = pd.to_datetime(articles_df.date, format="%Y-%m-%dT%H:%M:%S").dt.strftime("%Y/%m.json")
 
     # get text from contentRendered where available
     content_condition = (~pd.isna(articles_df.contentRendered)) & (articles_df.contentRendered != "")
@@ -135,7 +169,11 @@ def parse_articles(articles: list, section_name: str) -> pd.DataFrame:
 
     # get text scraping the url for those who dont have content
     url_condition = pd.isna(articles_df.text)
-    articles_df.loc[url_condition, "text"] = articles_df.loc[url_condition].url.apply(get_url_text)
+    if url_condition.any():
+        # get the texts concurrently
+        urls_text = list(EXECUTOR.map(get_url_text_parallel, articles_df.loc[url_condition].url.tolist()))
+
+        articles_df.loc[url_condition, "text"] = urls_text
 
     # set propper section name
     articles_df["section"] = section_name.replace("_", " ")
@@ -194,7 +232,7 @@ def process_batch_articles(articles: list, section_name: str, processed_ids: set
         end = False
 
     # remove articles that were already saved
-    articles_df = articles_df.loc[~articles_df.id.isin(processed_ids)]
+    articles_df = drop_processed(articles_df, processed_ids)
 
     # write results
     for file_path, group in articles_df.groupby("file_path"):
@@ -203,13 +241,14 @@ def process_batch_articles(articles: list, section_name: str, processed_ids: set
         write_to_json_safe(articles_data, file_path)
 
     if articles_df.shape[0] > 0:
-        # update processed ids set
-        updated_processed_ids = processed_ids.union(set(articles_df.id))
+        # update processed ids set in place
+        new_ids = set(articles_df.id)
+        processed_ids.update(new_ids)
 
-        # update file with processed ids
-        save_processed_ids(NEWSPAPER_NAME, section_name, updated_processed_ids)
+        # add the new ids to the processed ids file
+        append_processed_ids(NEWSPAPER_NAME, section_name, new_ids)
 
-    return end, updated_processed_ids
+    return end, processed_ids
 
 
 def get_section_data(section_name: str):
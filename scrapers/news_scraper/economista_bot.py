@@ -1,3 +1,4 @@
+import re
 import json
 import random
 import hashlib
@@ -7,11 +8,11 @@ from time import sleep
 from datetime import datetime
 from unidecode import unidecode
 from bs4 import BeautifulSoup as bs
-from multiprocessing.pool import ThreadPool
+from concurrent.futures import ThreadPoolExecutor
 
 from utils.config import END_YEAR
 from newspaper_config.economista import *
-from utils.methods import get_processed_ids, get_section_checkpoint, get_url, save_processed_ids, save_section_checkpoint, write_to_json_safe
+from utils.methods import get_processed_ids, get_response_html, get_section_checkpoint, get_url, append_processed_ids, drop_processed, save_section_checkpoint, write_to_json_safe
 
 
 # setup loggers
@@ -25,6 +26,12 @@ critical_logs = ["urllib3", "charset_normalizer", "filelock"]
 for logger_name in critical_logs:
     logging.getLogger(logger_name).setLevel(logging.ERROR)
 
+# threads reused by every batch to get the articles' text
+EXECUTOR = ThreadPoolExecutor(max_workers=NUM_THREADS)
+
+# regex used for every article
+LD_JSON_REGEX = re.compile(rb'<script[^>]*type="application/ld\+json"[^>]*>(.*?)</script>', re.DOTALL)
+
 
 def get_text(url: str) -> tuple[str, str]:
     """
@@ -42,16 +49,18 @@ def get_text(url: str) -> tuple[str, str]:
     """
 
     response = get_url(url, method="GET", headers=HEADERS)
-    soup = bs(response.content, "lxml")
-    
-    news_content = soup.find("script", {"type": "application/ld+json"})
+
+    # look for the json with the data first to avoid parsing the whole page
+    news_content = LD_JSON_REGEX.search(response.content)
     if news_content is not None:
         # get json with data
-        article_dict = json.loads(news_content.text)
+        article_dict = json.loads(news_content.group(1))
         
         summary_text = article_dict["description"]
         news_text = article_dict["articleBody"]
     else:
+        soup = bs(get_response_html(response), "lxml")
+
         # summary
         summary = soup.find("div", {"class": "resumeNew"})
         if summary is None:
@@ -124,18 +133,21 @@ def parse_articles(articles: list) -> pd.DataFrame:
     # rename columns
     articles_df = articles_df.rename(columns=RENAME_COLUMNS)
 
-    # cast columns
-    articles_df["date"] = articles_df.date.astype(float)/1000
-    articles_df["date"] = articles_df.date.apply(datetime.fromtimestamp)
+    # cast columns, timestamps are in ms and converted to local time
+    timestamps = articles_df.date.astype(float)/1000
+    articles_df["date"] = pd.to_datetime([datetime.fromtimestamp(ts) for ts in timestamps])
 
     # set constant columns
     articles_df["newspaper"] = NEWSPAPER_NAME.replace("_", " ")
 
     # build columns
-    articles_df["id"] = articles_df.url.apply(hash_url)
-    articles_df["file_path"] = articles_df.date.apply(lambda d: d.strftime("%Y/%m.json"))
-    articles_df["date"] = articles_df.date.apply(lambda d: d.strftime("%Y-%m-%dT%H:%M:%S"))
-    articles_df["section"] = articles_df.section.apply(unidecode).apply(str.lower)
+    articles_df["id"] = [hash_url(url) for url in articles_df.url]
+    articles_df["file_path"] = articles_df.date.dt.strftime("%Y/%m.json")
+    articles_df["date"] = articles_df.date.dt.strftime("%Y-%m-%dT%H:%M:%S")
+
+    # there are only a few different sections, normalize each one once
+    section_names = {section: unidecode(section).lower() for section in articles_df.section.unique()}
+    articles_df["section"] = articles_df.section.map(section_names)
 
     articles_df = articles_df[[
         "id",
@@ -188,7 +200,7 @@ def process_batch_articles(articles: list, processed_ids: set, section_name: str
     LOGGER.debug(f"{articles_df.shape[0]} after date filter")
 
     # remove articles that were already saved
-    articles_df = articles_df.loc[~articles_df.id.isin(processed_ids)]
+    articles_df = drop_processed(articles_df, processed_ids)
     LOGGER.debug(f"{articles_df.shape[0]} after ids filter")
 
     if articles_df.shape[0] == 0:
@@ -196,8 +208,7 @@ def process_batch_articles(articles: list, processed_ids: set, section_name: str
         return end, processed_ids
 
     # get articles text concurrently
-    with ThreadPool(NUM_THREADS) as p:
-        text_results = p.map(get_text_parallel, articles_df.url.tolist())
+    text_results = list(EXECUTOR.map(get_text_parallel, articles_df.url.tolist()))
 
     articles_text, articles_summary, error_messages = zip(*text_results)
 
@@ -207,7 +218,6 @@ def process_batch_articles(articles: list, processed_ids: set, section_name: str
     articles_df["error_message"] = list(error_messages)
 
     # save results
-    updated_processed_ids = processed_ids
     for file_path, group in articles_df.groupby("file_path"):
         group = group.drop(columns=["file_path"])
         
@@ -215,13 +225,14 @@ def process_batch_articles(articles: list, processed_ids: set, section_name: str
         articles_data = group.to_dict(orient="records")
         write_to_json_safe(articles_data, file_path)
 
-        # update processed ids set
-        updated_processed_ids = updated_processed_ids.union(set(group.id))
+    # update processed ids set in place
+    new_ids = set(articles_df.id)
+    processed_ids.update(new_ids)
 
-        # update file with processed ids
-        save_processed_ids(NEWSPAPER_NAME, section_name, updated_processed_ids)
+    # add the new ids to the processed ids file once all the groups are written
+    append_processed_ids(NEWSPAPER_NAME, section_name, new_ids)
 
-    return end, updated_processed_ids
+    return end, processed_ids
 
 
 def get_section_data(section_name: str):
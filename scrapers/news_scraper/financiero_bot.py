@@ -6,12 +6,12 @@ import pandas as pd
 from time import sleep
 from datetime import datetime
 from unidecode import unidecode
-from bs4 import BeautifulSoup as bs
-from multiprocessing.pool import ThreadPool
+from selectolax.lexbor import LexborHTMLParser
+from concurrent.futures import ThreadPoolExecutor
 
 from utils.config import END_YEAR
 from newspaper_config.financiero import *
-from utils.methods import get_processed_ids, get_section_checkpoint, get_url, save_processed_ids, save_section_checkpoint, write_to_json_safe
+from utils.methods import get_processed_ids, get_response_html, get_section_checkpoint, get_url, append_processed_ids, drop_processed, save_section_checkpoint, write_to_json_safe
 
 
 # setup loggers
@@ -25,6 +25,9 @@ critical_logs = ["urllib3", "charset_normalizer", "filelock"]
 for logger_name in critical_logs:
     logging.getLogger(logger_name).setLevel(logging.ERROR)
 
+# threads reused by every batch to get the articles' text
+EXECUTOR = ThreadPoolExecutor(max_workers=NUM_THREADS)
+
 
 def get_text(url: str) -> str:
     """
@@ -42,11 +45,14 @@ def get_text(url: str) -> str:
     """
 
     response = get_url(url, method="GET")
-    soup = bs(response.content, "lxml")
+    tree = LexborHTMLParser(get_response_html(response))
+
+    # scripts and styles aren't part of the text
+    tree.strip_tags(["script", "style"])
     
     # body
-    article = soup.find("article", {"class": "article-body-wrapper"})
-    news_text = "\n".join(c.text for c in article.children if c.name != "article")
+    article = tree.css_first("article.article-body-wrapper")
+    news_text = "\n".join(c.text() for c in article.iter(include_text=True) if c.tag != "article")
     
     return news_text
 
@@ -78,6 +84,32 @@ def get_text_parallel(url: str) -> tuple[str, str]:
     return article_text, error_message
 
 
+def flatten_article(article: dict) -> dict:
+    """
+    Get only the needed values from the article's nested data,
+    missing values are set as None
+
+    Parameters
+    ----------
+    article : dict
+        article's data as returned by the api
+
+    Returns
+    -------
+    dict
+        flat dict with the article's columns
+    """
+    article_row = {}
+    for column, keys in ARTICLE_KEYS.items():
+        value = article
+        for key in keys:
+            value = value.get(key) if isinstance(value, dict) else None
+
+        article_row[column] = value
+
+    return article_row
+
+
 def parse_articles(articles: list) -> pd.DataFrame:
     """
     Get all the information about the article
@@ -93,10 +125,8 @@ def parse_articles(articles: list) -> pd.DataFrame:
         data frame with the formatted articles
     """
     
-    articles_df = pd.json_normalize(articles)
-
-    # rename columns
-    articles_df = articles_df.rename(columns=RENAME_COLUMNS)
+    # extract only the needed columns instead of normalizing the whole json
+    articles_df = pd.DataFrame([flatten_article(article) for article in articles])
 
     # cast columns
     articles_df["date"] = pd.to_datetime(articles_df.date)
@@ -105,10 +135,13 @@ def parse_articles(articles: list) -> pd.DataFrame:
     articles_df["newspaper"] = NEWSPAPER_NAME.replace("_", " ")
 
     # build columns
-    articles_df["url"] = BASE_URL + articles_df["websites.elfinanciero.website_url"]
-    articles_df["file_path"] = articles_df.date.apply(lambda d: d.strftime("%Y/%m.json"))
-    articles_df["date"] = articles_df.date.apply(lambda d: d.strftime("%Y-%m-%dT%H:%M:%S"))
-    articles_df["section"] = articles_df.section.apply(unidecode).apply(str.lower)
+    articles_df["url"] = BASE_URL + articles_df.website_url
+    articles_df["file_path"] = articles_df.date.dt.strftime("%Y/%m.json")
+    articles_df["date"] = articles_df.date.dt.strftime("%Y-%m-%dT%H:%M:%S")
+
+    # there are only a few different sections, normalize each one once
+    section_names = {section: unidecode(section).lower() for section in articles_df.section.unique()}
+    articles_df["section"] = articles_df.section.map(section_names)
 
     articles_df = articles_df[[
         "id",
@@ -157,15 +190,14 @@ def process_batch_articles(articles: list, processed_ids: set, section_name: str
         articles_df = articles_df.loc[articles_df.date >= f"{END_YEAR}-01-01"]
 
     # remove articles that were already saved
-    articles_df = articles_df.loc[~articles_df.id.isin(processed_ids)]
+    articles_df = drop_processed(articles_df, processed_ids)
 
     if articles_df.shape[0] == 0:
         LOGGER.info("All articles have been processed")
         return end, processed_ids
 
     # get articles text concurrently
-    with ThreadPool(NUM_THREADS) as p:
-        text_results = p.map(get_text_parallel, articles_df.url.tolist())
+    text_results = list(EXECUTOR.map(get_text_parallel, articles_df.url.tolist()))
 
     articles_text, error_messages = zip(*text_results)
 
@@ -174,7 +206,6 @@ def process_batch_articles(articles: list, processed_ids: set, section_name: str
     articles_df["error_message"] = list(error_messages)
 
     # save results
-    updated_processed_ids = processed_ids
     for file_path, group in articles_df.groupby("file_path"):
         group = group.drop(columns=["file_path"])
         
@@ -182,13 +213,14 @@ def process_batch_articles(articles: list, processed_ids: set, section_name: str
         articles_data = group.to_dict(orient="records")
         write_to_json_safe(articles_data, file_path)
 
-        # update processed ids set
-        updated_processed_ids = updated_processed_ids.union(set(group.id))
+    # update processed ids set in place
+    new_ids = set(articles_df.id)
+    processed_ids.update(new_ids)
 
-        # update file with processed ids
-        save_processed_ids(NEWSPAPER_NAME, section_name, updated_processed_ids)
+    # add the new ids to the processed ids file once all the groups are written
+    append_processed_ids(NEWSPAPER_NAME, section_name, new_ids)
 
-    return end, updated_processed_ids
+    return end, processed_ids
 
 
 def get_section_data(section_name: str):
@@ -6,12 +6,13 @@ import pandas as pd
 from unidecode import unidecode
 from urllib.parse import urljoin
 from bs4 import BeautifulSoup as bs
+from selectolax.lexbor import LexborHTMLParser
 from datetime import datetime, timedelta
-from multiprocessing.pool import ThreadPool
+from concurrent.futures import ThreadPoolExecutor
 
 from utils.config import END_YEAR
 from newspaper_config.jornada import *
-from utils.methods import get_processed_ids, get_section_checkpoint, get_url, save_processed_ids, save_section_checkpoint, write_to_json_safe
+from utils.methods import get_processed_ids, get_response_html, get_section_checkpoint, get_url, append_processed_ids, drop_processed, save_section_checkpoint, write_to_json_safe
 
 # setup loggers
 LOGGER = logging.getLogger(__name__)
@@ -24,41 +25,52 @@ critical_logs = ["urllib3", "charset_normalizer", "filelock"]
 for logger_name in critical_logs:
     logging.getLogger(logger_name).setLevel(logging.ERROR)
 
+# threads reused by every batch to get the articles' text
+EXECUTOR = ThreadPoolExecutor(max_workers=NUM_THREADS)
+
+# regex used for every article
+WHITESPACE_REGEX = re.compile(r"([\t\n] *)+")
+TITLE_PREFIX_REGEX = re.compile(r"^ *La Jornada:")
+NEW_LINES_REGEX = re.compile(r"(\n *)+")
+
 
 def get_article_data(url: str):
     response = get_url(url, method="GET")
-    soup = bs(response.content, "lxml")
+    tree = LexborHTMLParser(get_response_html(response))
 
-    news_content = soup.find("script", {"type": "application/ld+json"})
+    news_content = tree.css_first('script[type="application/ld+json"]')
     if news_content is not None:
-        clean_content = re.sub(r"([\t\n] *)+", "", news_content.text)
+        clean_content = WHITESPACE_REGEX.sub("", news_content.text())
 
         # get json with data
         article_dict = json.loads(clean_content)
 
         summary_text = article_dict["description"]
-        title = re.sub(r"^ *La Jornada:", "", article_dict["headline"])
+        title = TITLE_PREFIX_REGEX.sub("", article_dict["headline"])
     else:
-        title = soup.find("div", {"class": "cabeza"}).text
+        title = tree.css_first("div.cabeza").text()
         summary_text = None
+
+    # scripts and styles aren't part of the text
+    tree.strip_tags(["script", "style"])
  
-    news_text = soup.find("div", {"id": "article-text"}).text
+    news_text = tree.css_first("div#article-text").text()
 
     # replace unwanted characters
     news_text = news_text.replace(u'\xa0', u' ')
 
     # replace unwanted data
     for class_name in ["pie-foto", "credito-autor", "credito-titulo", "hemero"]:
-        replace_div = soup.find("div", {"class": class_name})
+        replace_div = tree.css_first(f"div.{class_name}")
 
         if replace_div is not None:
-            replace_text = replace_div.text.strip()
+            replace_text = replace_div.text().strip()
             if len(replace_text) > 0:
                 replace_text = f"\n *{replace_text} *\n"
                 news_text = re.sub(replace_text, "\n", news_text)
     
     # replace multiple new lines with just one
-    news_text = re.sub("(\n *)+", "\n", news_text)
+    news_text = NEW_LINES_REGEX.sub("\n", news_text)
 
     # remove leading \n and spaces
     news_text = news_text.strip("\n").strip()
@@ -126,8 +138,7 @@ def parse_section_articles(section_articles: list, date_url: str):
     LOGGER.debug(f"Processing {len(article_urls)} articles")
 
     # get articles text concurrently
-    with ThreadPool(NUM_THREADS) as p:
-        article_results = p.map(get_articles_parallel, article_urls)
+    article_results = list(EXECUTOR.map(get_articles_parallel, article_urls))
 
     return list(article_results)
 
@@ -135,7 +146,7 @@ def parse_section_articles(section_articles: list, date_url: str):
 def get_section_data(section_url: str, date: datetime, section_name: str, processed_ids: set):
 
     response = get_url(section_url, method="GET")
-    soup = bs(response.content, "lxml")
+    soup = bs(get_response_html(response), "lxml")
 
     articles_div = soup.find("div", {"id": "section-cont"})
     if articles_div is None:
@@ -158,7 +169,7 @@ def get_section_data(section_url: str, date: datetime, section_name: str, proces
     articles_df["date"] = date.strftime("%Y-%m-%d")
 
     # remove articles that were already saved
-    articles_df = articles_df.loc[~articles_df.id.isin(processed_ids)]
+    articles_df = drop_processed(articles_df, processed_ids)
 
     if articles_df.shape[0] == 0:
         LOGGER.info("Section already processed")
@@ -169,14 +180,15 @@ def get_section_data(section_url: str, date: datetime, section_name: str, proces
     articles_data = articles_df.to_dict(orient="records")
     write_to_json_safe(articles_data, file_path)
 
-    # update processed ids set
-    updated_processed_ids = processed_ids.union(set(articles_df.id))
+    # update processed ids set in place
+    new_ids = set(articles_df.id)
+    processed_ids.update(new_ids)
 
-    # update file with processed ids
+    # add the new ids to the processed ids file
     ids_file_path = date.strftime("%Y/%m/%d")
-    save_processed_ids(NEWSPAPER_NAME, ids_file_path, updated_processed_ids)
+    append_processed_ids(NEWSPAPER_NAME, ids_file_path, new_ids)
 
-    return updated_processed_ids
+    return processed_ids
 
 
 def get_date_articles(date: datetime):
@@ -203,7 +215,7 @@ def get_date_articles(date: datetime):
         save_section_checkpoint(NEWSPAPER_NAME, date_data_file, FINISHED_STR)
         return
     
-    soup = bs(response.content, "lxml")
+    soup = bs(get_response_html(response), "lxml")
 
     sections = soup.find("div", {"class": "main-sections"}).find_all("td")
     for section in sections:
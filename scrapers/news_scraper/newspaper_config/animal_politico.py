@@ -1,6 +1,7 @@
 BASE_URL = "https://animalpolitico.com/"
 NEWSPAPER_NAME = "animal_politico"
 BATCH_SIZE = 20
+NUM_THREADS = 8
 
 # sections data
 SECTIONS = {
@@ -32,10 +32,12 @@ SECTIONS = [
 
 # processing vars
 NUM_THREADS = 8
-RENAME_COLUMNS = {
-    "_id": "id",
-    "display_date": "date",
-    "description.basic":"summary",
-    "headlines.basic": "title",
-    "websites.elfinanciero.website_section.name": "section"
+# path to each column's value inside the article's data
+ARTICLE_KEYS = {
+    "id": ("_id",),
+    "date": ("display_date",),
+    "summary": ("description", "basic"),
+    "title": ("headlines", "basic"),
+    "section": ("websites", "elfinanciero", "website_section", "name"),
+    "website_url": ("websites", "elfinanciero", "website_url")
 }
\ No newline at end of file
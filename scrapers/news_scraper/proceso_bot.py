@@ -8,11 +8,12 @@ from itertools import groupby
 from operator import itemgetter
 from urllib.parse import urljoin
 from bs4 import BeautifulSoup as bs
+from selectolax.lexbor import LexborHTMLParser
 from multiprocessing import cpu_count, Pool
 
 from utils.config import END_YEAR
 from newspaper_config.proceso import *
-from utils.methods import get_processed_ids, get_section_checkpoint, get_url, save_processed_ids, save_section_checkpoint, write_to_json_safe
+from utils.methods import get_processed_ids, get_response_html, get_section_checkpoint, get_url, append_processed_ids, save_section_checkpoint, write_to_json_safe
 
 # setup loggers
 LOGGER = logging.getLogger(__name__)
@@ -25,6 +26,29 @@ critical_logs = ["urllib3", "charset_normalizer", "filelock"]
 for logger_name in critical_logs:
     logging.getLogger(logger_name).setLevel(logging.ERROR)
 
+# regex used for every article
+FULL_DATE_REGEX = re.compile(r"\w+, (\d{1,2} de \w+ de \d{4}) .*")
+URL_DATE_REGEX = re.compile(r".*?\/(\d{4}\/\d{1,2}\/\d{1,2})\/.*")
+NEW_LINES_REGEX = re.compile(r"(\n *)+")
+UNWANTED_TEXT_REGEX = [
+    re.compile(regex)
+    for regex in [
+        r"\[video .*\]\[\/video\]",
+        r"\n.*? by .*?on Scribd",
+        r"\[\/caption\]\[caption .*?\]",
+        r"\[\/caption\]",
+        r"\[caption .*?\]",
+        r"https:\/\/(twitter|x)\.com\/.*?[ \n]",
+        r"Nota relacionada: *",
+        r"https:\/\/www\.proceso\.com\.mx\/.*?[ \n]",
+        r"\[playlist .*?\]",
+        r"https:\/\/www\.youtube\.com\/.*?[ \n]",
+        r"https:\/\/www\.facebook\.com\/.*?[ \n]",
+        r"https:\/\/www\.(.*?)\.com\/.*?[ \n]",
+        r"https:\/\/www\.(.*?)\.com\.mx\/.*?[ \n]",
+    ]
+]
+
 
 def get_text(url: str, get_date: bool=False) -> tuple[str, datetime]:
     """
@@ -55,14 +79,17 @@ def get_text(url: str, get_date: bool=False) -> tuple[str, datetime]:
         news_text = "---fotogaleria---"
 
     response = get_url(url, method="GET", headers=headers)
-    soup = bs(response.content, "lxml")
+    tree = LexborHTMLParser(get_response_html(response))
+
+    # scripts and styles aren't part of the text
+    tree.strip_tags(["script", "style"])
 
     if get_date:
-        date_div = soup.find("div", {"class":"fecha-y-seccion"})
-        full_date_str = date_div.find("div", {"class":"fecha"}).text
+        date_div = tree.css_first("div.fecha-y-seccion")
+        full_date_str = date_div.css_first("div.fecha").text()
         
         # get date from text
-        date_str = re.search(r"\w+, (\d{1,2} de \w+ de \d{4}) .*", full_date_str).group(1)
+        date_str = FULL_DATE_REGEX.search(full_date_str).group(1)
         article_date = datetime.strptime(date_str, "%d de %B de %Y")
     else:
         article_date = None
@@ -70,51 +97,35 @@ def get_text(url: str, get_date: bool=False) -> tuple[str, datetime]:
     if news_text is not None:
         return news_text, article_date
 
-    tags = [tag.text for tag in soup.find_all("a", {"class": "tag label"})]
+    tags = [tag.text() for tag in tree.css("a.tag.label")]
     if "Cartón" in tags:
         # article is a comic, so there's no text
         return "---carton---", article_date
     
-    caption = soup.find("figcaption")
-    if caption is not None and ("caricatura" in caption.text or "cartón" in caption.text):
+    caption = tree.css_first("figcaption")
+    if caption is not None and ("caricatura" in caption.text() or "cartón" in caption.text()):
         # article is a comic, so there's no text
         return "---carton---", article_date
     
     # div with the article's data
-    main_div = soup.find("article", {"class": "main-article"})
+    main_div = tree.css_first("article.main-article")
     
     # body
-    article = main_div.find("div", {"class": "cuerpo-nota"})
+    article = main_div.css_first("div.cuerpo-nota")
     news_text = "\n".join(
-        c.text
-        for c in article.children
-        if c.name is None or c.name in ["p", "blockquote", "div", "span", "em", "code"]
+        c.text()
+        for c in article.iter(include_text=True)
+        if c.tag in ["-text", "p", "blockquote", "div", "span", "em", "code"]
     )
 
     # remove unwanted text
-    unwanted_regex = [
-        r"\[video .*\]\[\/video\]",
-        r"\n.*? by .*?on Scribd",
-        r"\[\/caption\]\[caption .*?\]",
-        r"\[\/caption\]",
-        r"\[caption .*?\]",
-        r"https:\/\/(twitter|x)\.com\/.*?[ \n]",
-        r"Nota relacionada: *",
-        r"https:\/\/www\.proceso\.com\.mx\/.*?[ \n]",
-        r"\[playlist .*?\]",
-        r"https:\/\/www\.youtube\.com\/.*?[ \n]",
-        r"https:\/\/www\.facebook\.com\/.*?[ \n]",
-        r"https:\/\/www\.(.*?)\.com\/.*?[ \n]",
-        r"https:\/\/www\.(.*?)\.com\.mx\/.*?[ \n]",
-    ]
-    for regex in unwanted_regex:
-        news_text = re.sub(regex, "", news_text)
+    for regex in UNWANTED_TEXT_REGEX:
+        news_text = regex.sub("", news_text)
     
     # clean text
     news_text = news_text.replace(u'\xa0', u' ')
-    news_text = re.sub("(\n *)+", "\n", news_text)
-    news_text = re.sub("\n$", "", news_text)
-    news_text = re.sub("^\n", "", news_text)
+    news_text = NEW_LINES_REGEX.sub("\n", news_text)
+    news_text = news_text.removesuffix("\n").removeprefix("\n")
 
     if news_text == "" and "video" in url:
         news_text = "---video---"
@@ -161,10 +172,12 @@ def parse_article(article_str: str, section_name: str, article_id: str) -> tuple
     summary = article.find("p", {"class": "resumen"}).text
     
     # get date from url 
-    match = re.match(r".*?\/(\d{4}\/\d{1,2}\/\d{1,2})\/.*", path)
+    match = URL_DATE_REGEX.match(path)
     if match is not None:
         url_date_str = match.group(1)
-        url_date = datetime.strptime(url_date_str, "%Y/%m/%d")
+        # parsed by hand since strptime is slow for every article
+        year, month, day = url_date_str.split("/")
+        url_date = datetime(int(year), int(month), int(day))
 
         # stop processing article
         if url_date.year < END_YEAR:
@@ -189,12 +202,12 @@ def parse_article(article_str: str, section_name: str, article_id: str) -> tuple
             return None, True, None
         
     if url_date is not None:
-        final_date = url_date.strftime("%Y-%m-%d")
-        file_path = url_date.strftime("%Y/%m.json")
+        final_date = f"{url_date.year:04d}-{url_date.month:02d}-{url_date.day:02d}"
+        file_path = f"{url_date.year:04d}/{url_date.month:02d}.json"
 
     elif article_date is not None:
-        final_date = article_date.strftime("%Y-%m-%d") 
-        file_path = article_date.strftime("%Y/%m.json")
+        final_date = f"{article_date.year:04d}-{article_date.month:02d}-{article_date.day:02d}"
+        file_path = f"{article_date.year:04d}/{article_date.month:02d}.json"
 
     else:
         final_date = None
@@ -270,13 +283,14 @@ def process_page_articles(articles: list, section_name: str, processed_ids: set)
             articles_data = list(map(itemgetter(1), group))
             write_to_json_safe(articles_data, file_path)
 
-        # update processed ids set
-        updated_processed_ids = processed_ids.union(set(article_ids))
+        # update processed ids set in place
+        new_ids = set(article_ids)
+        processed_ids.update(new_ids)
 
-        # update file with processed ids
-        save_processed_ids(NEWSPAPER_NAME, section_name, updated_processed_ids)
+        # add the new ids to the processed ids file
+        append_processed_ids(NEWSPAPER_NAME, section_name, new_ids)
 
-    return end, updated_processed_ids
+    return end, processed_ids
 
 
 def get_section_data(section_name: str):
@@ -318,7 +332,7 @@ def get_section_data(section_name: str):
             break
         
         # get all articles
-        soup = bs(response.content, "lxml")
+        soup = bs(get_response_html(response), "lxml")
         articles = soup.find_all("article")
 
         final_page, updated_processed_ids = process_page_articles(articles, section_name, processed_ids)
@@ -9,4 +9,7 @@ IDS_PATH = "./data/ids/{newspaper}/"
 CHECKPOINT_PATH = "./data/checkpoints/{newspaper}/"
 LOCKS_PATH = "./data/locks/"
 
-END_YEAR = 2018
\ No newline at end of file
+END_YEAR = 2018
+
+# connections kept open per host, enough for the bots' thread pools
+POOL_SIZE = 16
\ No newline at end of file
@@ -1,15 +1,43 @@
 import os
+import re
 import json
+import codecs
 import random
 import requests
 import logging
+import pandas as pd
 from time import sleep
 from filelock import FileLock
+from requests.adapters import HTTPAdapter
 
-from utils.config import CHECKPOINT_PATH, IDS_PATH, LOCKS_PATH, OUT_PATH
+from utils.config import CHECKPOINT_PATH, IDS_PATH, LOCKS_PATH, OUT_PATH, POOL_SIZE
 
 LOGGER = logging.getLogger(__name__)
 
+# sessions shared by all the requests of a process so they reuse their connections
+_SESSIONS = {}
+
+# charset declared in the html, either <meta charset> or <meta http-equiv="Content-Type">
+META_CHARSET_REGEX = re.compile(rb"<meta[^>]+charset=[\"']?([\w-]+)", re.IGNORECASE)
+
+
+def get_session() -> requests.Session:
+    """
+    Get the session of the current process, a new one is created for each process
+    so forked workers don't share the parent's sockets
+    """
+    pid = os.getpid()
+
+    if pid not in _SESSIONS:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=POOL_SIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        _SESSIONS[pid] = session
+
+    return _SESSIONS[pid]
+
 
 def write_to_json_safe(articles_data: list, file_path: str):
     lock_path = file_path.replace(".json", ".lock")
@@ -92,6 +120,69 @@ def save_processed_ids(newspaper: str, section: str, processed_ids: set):
         json.dump(list(processed_ids), f)
 
 
+def append_processed_ids(newspaper: str, section: str, new_ids: set):
+    """
+    Add the new ids to the processed ids file without rewriting the ones already saved
+
+    Parameters
+    ----------
+    newspaper : str
+        name of the newspaper
+    section : str
+        name of the ids file
+    new_ids : set
+        ids processed since the file was last saved
+    """
+    newspaper_name = newspaper.lower()
+    file_name = os.path.join(IDS_PATH.format(newspaper=newspaper_name), f"{section}.json")
+
+    if len(new_ids) == 0:
+        return
+
+    if not os.path.isfile(file_name) or os.path.getsize(file_name) <= 2:
+        # file doesn't exist or is an empty list
+        save_processed_ids(newspaper, section, new_ids)
+        return
+
+    with open(file_name, 'a+') as f:
+        # go to the end of the file
+        f.seek(0, os.SEEK_END)
+        end_position = f.tell()
+
+        # remove the ending "]"
+        f.seek(end_position - 1, os.SEEK_SET)
+        f.truncate()
+
+        for processed_id in new_ids:
+            f.write(',')
+            json.dump(processed_id, f)
+
+        # rewrite ending bracket
+        f.write(']')
+
+
+def drop_processed(articles_df: pd.DataFrame, processed_ids: set) -> pd.DataFrame:
+    """
+    Remove the articles that were already saved
+
+    Parameters
+    ----------
+    articles_df : pd.DataFrame
+        df with the articles, must have an id column
+    processed_ids : set
+        set with the ids of the articles that have already been processed
+
+    Returns
+    -------
+    pd.DataFrame
+        df with only the new articles
+    """
+    # check each id against the set instead of passing the whole set to isin,
+    # isin converts the set to an array on every call
+    new_articles = [article_id not in processed_ids for article_id in articles_df.id]
+    return articles_df.loc[new_articles]
+
+
 def get_section_checkpoint(newspaper: str, section: str) -> str:
     newspaper_name = newspaper.lower()
     file_name = os.path.join(CHECKPOINT_PATH.format(newspaper=newspaper_name), f"{section}.txt")
@@ -118,22 +209,56 @@ def save_section_checkpoint(newspaper: str, section: str, checkpoint: str):
         f.write(checkpoint)
 
 
+def get_response_html(response: requests.Response) -> str:
+    """
+    Get the response's html already decoded, so the parser doesn't have to detect its encoding.
+    If the server doesn't declare a charset, requests would assume ISO-8859-1,
+    in that case the charset declared in the html is used and, if there's none,
+    the encoding is detected from the content
+    """
+    content_type = response.headers.get("Content-Type", "").lower()
+    if "charset" not in content_type:
+        response.encoding = get_declared_encoding(response.content) or response.apparent_encoding
+
+    return response.text
+
+
+def get_declared_encoding(content: bytes) -> str:
+    """
+    Get the encoding declared in the html's meta tags, None if it's missing or unknown
+    """
+    # the meta tags must be in the first bytes of the document
+    match = META_CHARSET_REGEX.search(content[:4096])
+    if match is None:
+        return None
+
+    encoding = match.group(1).decode("ascii")
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        return None
+
+    return encoding
+
+
 def get_url(url: str, method: str, headers: dict = None, data: str = None, params: dict = {}, max_retries: int = 3):
+    session = get_session()
+
     num_try = 0
     response = None
     while response is None:
         try:
             if method == "GET":
                 if headers is not None:
-                    response = requests.get(url, params=params, headers=headers)
+                    response = session.get(url, params=params, headers=headers)
                 else:
-                    response = requests.get(url, params=params)
+                    response = session.get(url, params=params)
             
             elif method == "POST":
                 if headers is not None:
-                    response = requests.post(url, data=data, headers=headers)
+                    response = session.post(url, data=data, headers=headers)
                 else:
-                    response = requests.post(url, data=data)
+                    response = session.post(url, data=data)
 
         except Exception as ex:
             if num_try >= max_retries:
@@ -2,23 +2,165 @@ import os
 import re
 import hashlib
 import logging
-import requests
-from time import sleep
-from bs4 import BeautifulSoup
+import fitz
+import threading
+import multiprocessing
+from time import monotonic
+import lxml.html
 from datetime import datetime
-from PyPDF2 import PdfFileReader
+from selectolax.lexbor import LexborHTMLParser
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 
-from utils.config import BASE_URL, BASE_URL_V2
+from utils.config import BASE_URL, BASE_URL_V2, PDF_TIMEOUT, PDF_QUEUE_TIMEOUT
+from utils.methods import SESSION
 
 LOGGER = logging.getLogger(__name__)
 
+# regex used for every publication
+NEW_LINES_REGEX = re.compile(r"(\n *)+")
+AUTHOR_REGEX = re.compile(r"^(.+?) \((.*)\)", re.MULTILINE)
+REDIRECT_REGEX = re.compile(r"window\.location\.href\s*=\s*\"([^\"]+)\"")
+
+# pool shared by all the publications to parse the pdfs outside of the main process
+_PDF_EXECUTOR = None
+_PDF_EXECUTOR_LOCK = threading.Lock()
+
+
+def _build_pdf_executor() -> ProcessPoolExecutor:
+    # spawn the workers, forking while other threads are doing requests can deadlock them
+    return ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+
+
+def start_pdf_executor():
+    """
+    Create the process pool used to parse the pdfs,
+    it should be called before starting the threads that process the publications
+    """
+    global _PDF_EXECUTOR
+
+    with _PDF_EXECUTOR_LOCK:
+        if _PDF_EXECUTOR is None:
+            _PDF_EXECUTOR = _build_pdf_executor()
+
+
+def get_pdf_executor() -> ProcessPoolExecutor:
+    """
+    Get the process pool used to parse the pdfs, it's created if it wasn't started
+    """
+    start_pdf_executor()
+    return _PDF_EXECUTOR
+
+
+def reset_pdf_executor(failed_executor: ProcessPoolExecutor):
+    """
+    Replace the process pool after one of its workers died or got stuck,
+    only the first thread that finds the failed pool replaces it
+    """
+    global _PDF_EXECUTOR
+
+    with _PDF_EXECUTOR_LOCK:
+        if _PDF_EXECUTOR is failed_executor:
+            # kill the workers, a stuck one wouldn't stop on shutdown
+            for process in list((failed_executor._processes or {}).values()):
+                process.terminate()
+
+            failed_executor.shutdown(wait=False, cancel_futures=True)
+            _PDF_EXECUTOR = _build_pdf_executor()
+
+
+def shutdown_pdf_executor():
+    """
+    Stop the process pool used to parse the pdfs
+    """
+    global _PDF_EXECUTOR
+
+    with _PDF_EXECUTOR_LOCK:
+        if _PDF_EXECUTOR is not None:
+            _PDF_EXECUTOR.shutdown(wait=True)
+            _PDF_EXECUTOR = None
+
+
+class PdfTimeoutError(Exception):
+    """
+    Parsing the pdf took longer than the allowed time
+    """
+
+
+class TooManyConnectionsError(Exception):
+    """
+    The senate's server is overloaded and refused the request
+    """
+
+
+def parse_table_date(date_str: str) -> datetime:
+    """
+    Parse a yyyy/mm/dd date from the publications table,
+    done by hand since strptime is slow for every row
+    """
+    year, month, day = date_str.split("/")
+    return datetime(int(year), int(month), int(day))
+
+
+def parse_row_date(table_row) -> datetime:
+    """
+    Get the publication's date from its row in the publications table,
+    stops looking for columns once the date column is found
+    """
+    date_col = table_row.find("td[3]")
+    return parse_table_date(date_col.text_content())
+
+
+def parse_pdf(doc_path: str, timeout: float = None) -> str:
+    """
+    Get the full text from a pdf file
+
+    Parameters
+    ----------
+    doc_path : str
+        path to the pdf file
+    timeout : float, optional
+        max seconds to spend parsing the pdf, by default there is no limit
+
+    Returns
+    -------
+    str
+        text of all the pages in the pdf
+
+    Raises
+    ------
+    PdfTimeoutError
+        if parsing the pdf takes longer than the timeout
+    """
+    start_time = monotonic()
+
+    with fitz.open(doc_path) as pdf:
+        LOGGER.debug(f"pdf has {pdf.page_count} pages")
+
+        pages_texts = []
+        for page in pdf:
+            # the time is checked in the worker so it doesn't include the time waiting in the pool's queue
+            if timeout is not None and monotonic() - start_time > timeout:
+                raise PdfTimeoutError(f"Parsing {doc_path} took more than {timeout}s")
+
+            LOGGER.debug(f"Getting text from page {page.number}")
+            page_text = page.get_text("text")
+
+            # clean text
+            page_text = page_text.strip()
+            page_text = NEW_LINES_REGEX.sub("\n", page_text)
+
+            pages_texts.append(page_text)
+
+    return "\n".join(pages_texts)
+
 
 class SenatePublication():
     def __init__(self, comm_type: str, table_data, download_path: str, page: int):
         self.type = comm_type
         self._page = page
-        self.__raw_table_data = str(table_data)
-        self.__table_data = table_data.find_all("td")
+        self.__raw_table_data = lxml.html.tostring(table_data, encoding="unicode", with_tail=False)
+        self.__table_data = table_data.findall("td")
         self.__download_path = download_path
 
         self.__get_date()
@@ -26,26 +168,26 @@ class SenatePublication():
 
     def __get_date(self):
         date_col = self.__table_data[2]
-        self.date = datetime.strptime(date_col.text, "%Y/%m/%d")
+        self.date = parse_table_date(date_col.text_content())
 
     def __get_id(self):
-        original_url = self.__table_data[-1].find("a")
+        original_url = self.__table_data[-1].find(".//a")
 
         if original_url is None:
             self.__full_data = False
-            url = self.__table_data[0].find("a").attrs["href"]
+            url = self.__table_data[0].find(".//a").get("href")
 
             if "https" not in url:
-                url = re.sub(r"^/", "", url)
+                url = url.removeprefix("/")
                 self.url = f"{BASE_URL_V2}/{url}"
             else:
                 self.url = url
         else:
             self.__full_data = True
-            url = original_url.attrs["href"]
+            url = original_url.get("href")
 
             if "https" not in url:
-                url = re.sub(r"^/", "", url)
+                url = url.removeprefix("/")
                 self.url = f"{BASE_URL}/{url}"
             else:
                 self.url = url
@@ -66,65 +208,59 @@ class SenatePublication():
             self.full_text = self.summary
 
     def __get_summary(self):
-        summary = self.__table_data[1].text
+        summary = self.__table_data[1].text_content()
         self.summary = summary.replace("\n", " ")
 
     def __get_authors_data(self):
         """
         Get the senators and political parties involved
         """
-        authors_text = self.__table_data[3].get_text(separator="\n", strip=True)
+        authors_lines = [t.strip() for t in self.__table_data[3].xpath(".//text()")]
+        authors_lines = [line for line in authors_lines if line != ""]
+        authors_text = "\n".join(authors_lines)
 
         if authors_text == "":
             LOGGER.warning(f"No authors data found for {self.url}")
             self.authors = []
             self.parties = []
         else:
-            self.authors = []
-            parties = set()
-            for author in authors_text.split("\n"):
-                author_info = re.match(r"(.+?) \((.*)\)", author)
-                self.authors.append(author_info.group(1))
-                parties.add(author_info.group(2))
+            # each line has an author with its party
+            authors_info = AUTHOR_REGEX.findall(authors_text)
+            if len(authors_info) != len(authors_lines):
+                LOGGER.warning(
+                    f"Only {len(authors_info)} of {len(authors_lines)} authors lines could be parsed for {self.url}"
+                )
 
-            self.parties = list(parties)
+            self.authors = [author for author, _ in authors_info]
+            self.parties = list({party for _, party in authors_info})
 
     def __get_url_data(self):
         LOGGER.debug(self.url)
 
-        tries = 1
-        success = False
-        while not success and tries <= 5:
-            try:
-                response = requests.get(self.url)
-            except Exception:
-                LOGGER.warning(f"Error loading url {self.url}, retrying ({tries})...")
-                sleep(tries*2)
-                tries += 1                
-            else:
-                if response.text == "Connection failed: Too many connections":
-                    LOGGER.warning(f"Too many connections error, retrying ({tries})...")
-                    sleep(tries*2)
-                    tries += 1  
-                else:
-                    success = True
-        
-        if not success:
-            raise Exception("Couldnt load url")
-            
-        self.__bs = BeautifulSoup(response.text, "lxml")
+        # network errors and 5xx responses are already retried by the session's adapter
+        response = SESSION.get(self.url, timeout=30)
+
+        # fail fast, the caller retries the publication once the rest are done
+        if response.text == "Connection failed: Too many connections":
+            raise TooManyConnectionsError(f"Too many connections loading {self.url}")
+
+        self.__tree = LexborHTMLParser(response.text)
 
     def __validate_data(self):
         """
         Check if the loaded page has a redirect url, if so use that as the 
         publication's url and load it
         """
-        script_data = self.__bs.find("script")
+        script_data = self.__tree.css_first("script")
+        if script_data is None:
+            return
 
-        if "window.location.href" in script_data.text:
+        redirect = REDIRECT_REGEX.search(script_data.text())
+        if redirect is not None:
             # get the real url for the publication
-            new_url = re.search(r"window\.location\.href = \"(.*)\"", script_data.text).group(1)
-            new_url = new_url.replace("http", "https")
+            new_url = redirect.group(1)
+            if new_url.startswith("http://"):
+                new_url = "https://" + new_url.removeprefix("http://")
 
             # replace for the real url
             self.url = new_url
@@ -134,91 +270,105 @@ class SenatePublication():
         """
         Download the doc and get the full text from the pdf
         """
+        # prefix the publication id, several publications can link docs with the same name
         doc_name = self.doc_url.split("/")[-1]
-        self.doc_path = f"{self.__download_path}/{doc_name}"
+        self.doc_path = f"{self.__download_path}/{self._id}_{doc_name}"
+
+        # download doc, streaming it to disk in chunks
+        with SESSION.get(self.doc_url, stream=True, timeout=60) as response:
+            if response.status_code != 200:
+                LOGGER.warning(f"Couldn't download file {self.doc_url} , status {response.status_code}")
+                self.full_text = self.summary
+                return
 
-        # download doc
-        response = requests.get(self.doc_url)
-        if response.status_code != 200:
-            LOGGER.warning(f"Couldn't download file {self.doc_url} , status {response.status_code}")
-            self.full_text = self.summary
-        else:
             with open(self.doc_path, "wb") as f:
-                f.write(response.content)
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    f.write(chunk)
 
-            # get text from pdf
-            self.__get_pdf_text()
+        # get text from pdf
+        self.__get_pdf_text()
         
     def __get_full_text(self):
-        main_container = self.__bs.find("div", {"class": "container-fluid bg-content main"})
+        main_container = self.__tree.css_first("div.container-fluid.bg-content.main")
 
         if main_container is None:
             self.__get_full_text_v2()
         else:
-            panel = main_container.find("div", {"class": "panel-group"}).find_all("div", {"class": "panel panel-default"}, recursive=False)[2]
+            panel_group = main_container.css_first("div.panel-group")
+            panels = [
+                node for node in panel_group.iter()
+                if node.tag == "div" and node.attributes.get("class") == "panel panel-default"
+            ]
+            panel = panels[2]
 
-            heading = panel.find("div", "panel-heading")
+            heading = panel.css_first("div.panel-heading")
 
-            if heading is not None and "Archivos para descargar" in heading.text: 
+            if heading is not None and "Archivos para descargar" in heading.text(): 
                 # there is a doc to download
-                self.doc_url = panel.find("a").attrs["href"]
+                self.doc_url = panel.css_first("a").attributes["href"]
                 
                 self.__download_and_parse_doc()
             else:
-                self.full_text = panel.get_text(separator="\n", strip=True)
+                self.full_text = panel.text(separator="\n", strip=True, skip_empty=True)
 
     def __get_full_text_v2(self):
-        main_container = self.__bs.find("div", {"class": "container-fluid main"})
+        main_container = self.__tree.css_first("div.container-fluid.main")
 
         if main_container is None:
             LOGGER.warning(f"No data for {self.url}")
             self.full_text = self.summary
             return
         
-        # get all the headers in the main container
-        header_divs = main_container.find_all("div", {"class": "card-header"})
-        headers = [h.text.strip() for h in header_divs]
-
-        try:
-            header_pos = headers.index("Archivos para descargar:")
-        except ValueError:
-            LOGGER.debug("Download doc not found")
-            doc_panel = None
-        else:
-            # get the body after the download header
-            doc_panel = header_divs[header_pos].find_next_sibling(attrs={"class": "card-body"})
+        # walk the headers and bodies once, in page order
+        doc_panel = None
+        bodies = []
+        after_doc_header = False
+        for card in main_container.css("div.card-header, div.card-body"):
+            if "card-header" in (card.attributes.get("class") or "").split():
+                after_doc_header = card.text().strip() == "Archivos para descargar:"
+                continue
+
+            bodies.append(card)
+            if after_doc_header and doc_panel is None:
+                # the body after the download header
+                doc_panel = card
+            after_doc_header = False
 
         if doc_panel is not None: 
             # there is a doc to download
-            self.doc_url = doc_panel.find("a").attrs["href"]
+            self.doc_url = doc_panel.css_first("a").attributes["href"]
             
             self.__download_and_parse_doc()
         else:
-            text_panel = main_container.find_all("div", {"class": "card-body"})[1]
-            self.full_text = text_panel.get_text(separator="\n", strip=True)
+            LOGGER.debug("Download doc not found")
+            text_panel = bodies[1]
+            self.full_text = text_panel.text(separator="\n", strip=True, skip_empty=True)
 
     def __get_pdf_text(self):
-        try:           
-            pdf = PdfFileReader(open(self.doc_path, "rb"))
-            LOGGER.debug(f"pdf has {pdf.numPages} pages")
+        # parsing is CPU bound, run it in the process pool
+        # a worker can die while parsing any pdf, so retry once in a new pool before failing this one
+        for _ in range(2):
+            executor = get_pdf_executor()
 
-        except Exception:
-            pdf = PdfFileReader(open(self.doc_path, "rb"), strict=False)
-            LOGGER.debug(f"pdf has {pdf.numPages} pages")
-
-        pages_texts = []
-        for page_num in range(pdf.numPages):
-            LOGGER.debug(f"Getting text from page {page_num}")
-            page = pdf.getPage(page_num)
-            page_text = page.extractText()
-
-            # clean text
-            page_text = page_text.strip()
-            page_text = re.sub(r"(\n *)+", "\n", page_text)
-
-            pages_texts.append(page_text)
-
-        self.full_text = "\n".join(pages_texts)
+            try:
+                future = executor.submit(parse_pdf, self.doc_path, PDF_TIMEOUT)
+                self.full_text = future.result(timeout=PDF_TIMEOUT + PDF_QUEUE_TIMEOUT)
+                return
+            except PdfTimeoutError:
+                LOGGER.warning(f"Parsing {self.doc_path} took more than {PDF_TIMEOUT}s, using the summary instead")
+                self.full_text = self.summary
+                return
+            except FutureTimeoutError:
+                # the worker is stuck inside a page, restart the pool to kill it
+                LOGGER.warning(f"Parsing {self.doc_path} got stuck, restarting the pool and using the summary instead")
+                reset_pdf_executor(executor)
+                self.full_text = self.summary
+                return
+            except BrokenProcessPool:
+                LOGGER.warning(f"A pdf worker died while parsing {self.doc_path}, restarting the pool")
+                reset_pdf_executor(executor)
+
+        raise Exception(f"Couldn't parse {self.doc_path}, the pdf worker died")
 
     def get_json(self):
         return {k: v for k, v in self.__dict__.items() if not k.startswith("_") or  k == "_id"}
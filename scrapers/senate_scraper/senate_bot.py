@@ -1,13 +1,16 @@
 import sys
 import logging
+from time import sleep
+from collections import deque
 from datetime import datetime, timedelta
+from multiprocessing.pool import ThreadPool
 
 # local imports
 from chrome_driver import ChromeDriver
-from publication import SenatePublication
+from publication import SenatePublication, TooManyConnectionsError, parse_row_date, start_pdf_executor, shutdown_pdf_executor
 from utils import methods
 from utils.config import *
-from utils.db import connect_mongo_db, save_publications, publication_exists
+from utils.db import connect_mongo_db, save_publications, get_existing_publications, get_publication_ids
 
 
 # setup loggers
@@ -17,11 +20,41 @@ logging.basicConfig(
     format='%(asctime)s %(name)s [%(levelname)s]: %(message)s',
     datefmt='%Y-%m-%dT%H:%M:%S'
 )
-critical_logs = ["urllib3", "selenium", "PyPDF2"]
+critical_logs = ["urllib3", "selenium", "fitz"]
 for logger_name in critical_logs:
     logging.getLogger(logger_name).setLevel(logging.ERROR)
 
 
+def build_comm_parallel(comm: SenatePublication) -> tuple[SenatePublication, bool, bool]:
+    """
+    Wrapper to call the `build_full_doc` method in parallel and catch any errors
+
+    Parameters
+    ----------
+    comm : SenatePublication
+        publication to build
+
+    Returns
+    -------
+    SenatePublication
+        the publication with its full data
+    bool
+        flag that indicates if the publication was built without errors
+    bool
+        flag that indicates if the publication should be retried later
+    """
+    try:
+        comm.build_full_doc()
+    except TooManyConnectionsError:
+        return comm, False, True
+    except Exception:
+        LOGGER.error(f"Couldn't process publication {comm.url}, from page {comm._page}", exc_info=True)
+        comm.save_table_data()
+        return comm, False, False
+
+    return comm, True, False
+
+
 def process_comms(full_comms: list, conn):
     """
     Finish processing all the publications
@@ -33,25 +66,61 @@ def process_comms(full_comms: list, conn):
     conn :
         client to the Mongo DB
     """
+    # check which publications were saved in the meantime with a single query
+    saved_ids = get_existing_publications([comm._id for comm in full_comms], TABLE_NAME, conn)
+    pending_comms = [comm for comm in full_comms if comm._id not in saved_ids]
+    LOGGER.debug(f"{len(saved_ids)} publications have already been processed")
+
+    # start the pdf workers before the threads so the pool isn't created while requests are running
+    start_pdf_executor()
+
+    try:
+        # get the full data concurrently, results are saved in batches as they arrive
+        publications_batch = []
+        retry_stack = deque()
+        with ThreadPool(NUM_THREADS) as p:
+            for i, (comm, built, retry) in enumerate(p.imap(build_comm_parallel, pending_comms)):
+                if i % 20 == 0:
+                    LOGGER.info(f"Processed {i} {comm.type}")
+
+                if built:
+                    publications_batch.append(comm.get_json())
+                elif retry:
+                    retry_stack.append((comm, 1))
+
+                if len(publications_batch) >= SAVE_BATCH_SIZE:
+                    save_publications(publications_batch, TABLE_NAME, conn)
+                    publications_batch = []
+
+        # retry the publications rejected by the overloaded server one at a time,
+        # the last one to fail is the first one retried
+        if len(retry_stack) > 0:
+            LOGGER.info(f"Retrying {len(retry_stack)} publications after too many connections errors")
+
+        while len(retry_stack) > 0:
+            comm, tries = retry_stack.pop()
+            sleep(tries)
+
+            comm, built, retry = build_comm_parallel(comm)
+            if built:
+                publications_batch.append(comm.get_json())
+            elif retry and tries < MAX_RETRIES:
+                retry_stack.append((comm, tries + 1))
+            elif retry:
+                LOGGER.error(f"Too many connections processing {comm.url}, from page {comm._page}")
+                comm.save_table_data()
 
-    for i, comm in enumerate(full_comms):
-        if i % 20 == 0:
-            LOGGER.info(f"Saved {i} {comm.type}")
+            if len(publications_batch) >= SAVE_BATCH_SIZE:
+                save_publications(publications_batch, TABLE_NAME, conn)
+                publications_batch = []
 
-        # get the full data
-        if not publication_exists(comm._id, TABLE_NAME, conn):
-            try:
-                comm.build_full_doc()
-            except Exception:
-                LOGGER.error(f"Couldn't process publication {comm.url}, from page {comm._page}", exc_info=True)
-                comm.save_table_data()
-            else:
-                save_publications(comm.get_json(), TABLE_NAME, conn)
-        else:
-            LOGGER.debug(f"Publication {comm._id} has already been processed")
+        if len(publications_batch) > 0:
+            save_publications(publications_batch, TABLE_NAME, conn)
+    finally:
+        shutdown_pdf_executor()
 
 
-def process_page(page_source: str, start_date: datetime, end_date: datetime, comm_type: str, page_num: int, conn) -> list:
+def process_page(page_source: str, start_date: datetime, end_date: datetime, comm_type: str, page_num: int, saved_ids: set) -> list:
     """
     Get all the relevant publications from the current page
 
@@ -67,31 +136,32 @@ def process_page(page_source: str, start_date: datetime, end_date: datetime, com
         iniciativas or proposiciones
     page_num : int
         number of the page to process
+    saved_ids : set
+        ids of the publications already saved in the db
     
     Returns
     -------
     list
         list with the publications that need to be processed
     """
-    page_comms = []
+    in_range_comms = []
 
-    out_of_range = total_comms = processed_comms = 0
+    out_of_range = total_comms = 0
     for data in methods.get_page_comms(page_source):
-        comm = SenatePublication(comm_type, data, DOWNLOAD_PATH, page_num)
-
-        if comm.date >= start_date and comm.date <= end_date:
+        # check the date before building the publication to skip parsing the whole row
+        comm_date = parse_row_date(data)
 
-            if not publication_exists(comm._id, TABLE_NAME, conn):
-                page_comms.append(comm)
-            else:
-                LOGGER.debug(f"Publication {comm._id} has already been processed")
-                processed_comms += 1
-        
+        if comm_date >= start_date and comm_date <= end_date:
+            comm = SenatePublication(comm_type, data, DOWNLOAD_PATH, page_num)
+            in_range_comms.append(comm)
         else:
             out_of_range += 1
 
         total_comms += 1
 
+    page_comms = [comm for comm in in_range_comms if comm._id not in saved_ids]
+    processed_comms = len(in_range_comms) - len(page_comms)
+
     LOGGER.info(f"{len(page_comms)} out of {total_comms} publications to process")
     LOGGER.debug(f"{processed_comms} are already processed")
     LOGGER.debug(f"{out_of_range} are out of the provided date range")
@@ -121,6 +191,10 @@ def load_legislature_data(legis_number: str, comm_type: str, start_date: datetim
     driver = ChromeDriver(driver_path=DRIVER_PATH, headless=HEADLESS, download_path=DOWNLOAD_PATH)
     driver.get(url)
 
+    # load the saved ids once instead of querying the db for every page
+    saved_ids = get_publication_ids(TABLE_NAME, conn)
+    LOGGER.debug(f"{len(saved_ids)} publications already saved")
+
     # get total pages to process
     main_table = driver.get_element(TABLE_XPATH)
     total_pages = methods.get_total_pages(main_table.get_attribute("outerHTML"))
@@ -138,7 +212,7 @@ def load_legislature_data(legis_number: str, comm_type: str, start_date: datetim
         main_table = driver.get_element(TABLE_XPATH)
 
         LOGGER.info(f"Processing page {current_page} out of {total_pages}")
-        page_comms = process_page(main_table.get_attribute("outerHTML"), start_date, end_date, comm_type, current_page, conn)
+        page_comms = process_page(main_table.get_attribute("outerHTML"), start_date, end_date, comm_type, current_page, saved_ids)
         full_comms.extend(page_comms)
 
     driver.close()
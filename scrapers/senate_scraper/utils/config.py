@@ -12,7 +12,23 @@ BASE_URL_V2 = "https://pleno.senado.gob.mx/infosen/infosen64"
 HEADLESS = True
 DOWNLOAD_PATH = os.path.join(os.getcwd(), "downloads")
 
+# keep it low, the senate's server answers "Too many connections" when overloaded
+NUM_THREADS = 8
+
+# times a publication is retried after a "Too many connections" error
+MAX_RETRIES = 5
+
+# max seconds a worker spends parsing a pdf, checked between pages
+PDF_TIMEOUT = 60
+
+# extra seconds to wait for a pdf while it's queued, after that the pool is restarted
+PDF_QUEUE_TIMEOUT = 120
+
+# publications inserted to the db with each request
+SAVE_BATCH_SIZE = 100
+
 TABLE_XPATH = '//*[@id="viewDataBase"]/div'
+ACTIVE_PAGE_XPATH = '(' + TABLE_XPATH + '//ul[contains(@class, "pagination")])[1]/li[contains(@class, "active")]'
 
 LOAD_PAGE_SCRIPT = 'loadData({page_num}, "fecha_presentacion", "DESC", 250, "asunto,sintesis,fechaPresentacion,autores,turno,leyesModifica,aprobacion,estatus,camaraOrigen,resolutivo")'
 
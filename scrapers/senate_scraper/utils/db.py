@@ -1,10 +1,27 @@
 import os
 import json
 import pathlib
+from functools import lru_cache
 from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
 from pymongo.server_api import ServerApi
 
 
+@lru_cache(maxsize=None)
+def _get_client(uri: str, cert_file: str) -> MongoClient:
+    """
+    Build the mongo client only once per uri and certificate,
+    the client already keeps its own connection pool
+    """
+    client = MongoClient(
+        host=uri,
+        tls=True,
+        tlsCertificateKeyFile=cert_file,
+        server_api=ServerApi('1')
+    )
+    return client
+
+
 def connect_mongo_db(db_name: str):
     """
     Parameters
@@ -22,12 +39,7 @@ def connect_mongo_db(db_name: str):
     cert_file = f"{parent_path}/config/bot-cert.pem"
 
     uri = "mongodb+srv://senate-publication.at2rlna.mongodb.net/?authSource=%24external&authMechanism=MONGODB-X509&retryWrites=true&w=majority"
-    client = MongoClient(
-        host=uri,
-        tls=True,
-        tlsCertificateKeyFile=cert_file,
-        server_api=ServerApi('1')
-    )
+    client = _get_client(uri, cert_file)
     return client[db_name]
 
 
@@ -37,9 +49,33 @@ def publication_exists(publication_id: str, table_name, conn) -> bool:
     """
 
     table = conn[table_name]
-    num_records = table.count_documents({"_id": publication_id})
-    
-    return num_records > 0
+    record = table.find_one({"_id": publication_id}, {"_id": 1})
+
+    return record is not None
+
+
+def get_existing_publications(publication_ids: list, table_name, conn) -> set:
+    """
+    Get which of the given publications are already in the db,
+    using a single query instead of one per publication
+    """
+    if len(publication_ids) == 0:
+        return set()
+
+    table = conn[table_name]
+    records = table.find({"_id": {"$in": publication_ids}}, {"_id": 1})
+
+    return {record["_id"] for record in records}
+
+
+def get_publication_ids(table_name, conn) -> set:
+    """
+    Get the ids of all the publications saved in the db
+    """
+    table = conn[table_name]
+    records = table.find({}, {"_id": 1})
+
+    return {record["_id"] for record in records}
 
 
 def save_publication_json(publication):
@@ -56,7 +92,7 @@ def save_publication_json(publication):
     with open(json_path, "w") as f:
         comm_dict = {k: v for k, v in publication.__dict__.items() if not k.startswith("_")}
         comm_dict["date"] = comm_dict["date"].isoformat()
-        json.dump(comm_dict, f)
+        json.dump(comm_dict, f, separators=(",", ":"))
 
 
 def save_publications(publications, table_name, conn):
@@ -76,7 +112,14 @@ def save_publications(publications, table_name, conn):
     table = conn[table_name]
 
     if insert_many:
-        table.insert_many(publications)
+        try:
+            # unordered so a duplicated publication doesn't stop the rest of the batch
+            table.insert_many(publications, ordered=False)
+        except BulkWriteError as ex:
+            # only ignore the publications that were already saved
+            write_errors = [e for e in ex.details["writeErrors"] if e["code"] != 11000]
+            if len(write_errors) > 0 or ex.details.get("writeConcernErrors"):
+                raise
     else:
         table.insert_one(publications)
 
@@ -105,7 +148,8 @@ def update_publications(publications, table_name, conn):
             ) 
             for p in publications
         ]
-        table.bulk_write(updates)
+        # updates are independent, let the server apply them in any order
+        table.bulk_write(updates, ordered=False)
     else:
         update_fields = {k: v for k, v in publications.items() if k != "_id"}
         table.update_one({"_id": publications["_id"]}, {"$set": update_fields})
@@ -1,15 +1,30 @@
 
 import re
-import time
 import logging
+import requests
+import lxml.html
 from datetime import datetime
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from selenium.common.exceptions import TimeoutException
 
-from .config import TABLE_XPATH, LOAD_PAGE_SCRIPT
+from .config import ACTIVE_PAGE_XPATH, LOAD_PAGE_SCRIPT, NUM_THREADS
 
 LOGGER = logging.getLogger(__name__)
 
+# regex used on every call
+DATE_REGEX = re.compile(r"\d{4}-\d{2}-\d{2}")
+PAGES_REGEX = re.compile(r"Página \d+ de (\d+),")
+
+# shared session so the requests to the senate's site reuse their connections
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_maxsize=NUM_THREADS,
+    max_retries=Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
+)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+
 
 def parse_date(date_str: str) -> datetime:
     """
@@ -26,26 +41,26 @@ def parse_date(date_str: str) -> datetime:
     datetime
     """
 
-    assert re.match(r"\d{4}-\d{2}-\d{2}", date_str) is not None, "Date must be in yyyy-mm-dd format"
-    date = datetime.strptime(date_str, "%Y-%m-%d")
+    assert DATE_REGEX.match(date_str) is not None, "Date must be in yyyy-mm-dd format"
+    year, month, day = date_str.split("-")
+    date = datetime(int(year), int(month), int(day))
 
     return date
 
 
 def get_total_pages(page_source: str):
-    bs = BeautifulSoup(page_source, "lxml")
-    pages_info = bs.find("div", {"class": "panel-heading"}).find("p")
+    tree = lxml.html.fromstring(page_source)
+    pages_info = tree.xpath("(//div[contains(concat(' ', normalize-space(@class), ' '), ' panel-heading ')])[1]//p")[0]
 
     # use regex to find total
-    total_pages = re.search(r"Página \d+ de (\d+),", pages_info.text).group(1)
+    total_pages = PAGES_REGEX.search(pages_info.text_content()).group(1)
 
     return int(total_pages)
 
 
 def get_page_comms(page_source: str):
-    bs = BeautifulSoup(page_source, "lxml")
-    comms_table = bs.find("table").find("tbody")
-    return comms_table.find_all("tr")
+    tree = lxml.html.fromstring(page_source)
+    return tree.xpath("(//table)[1]/tbody//tr")
 
 
 def wait_new_page(driver, new_page: int, current_table, max_tries: int = 3):
@@ -76,21 +91,14 @@ def wait_new_page(driver, new_page: int, current_table, max_tries: int = 3):
         try:
             driver.wait_element_is_old(current_table, wait_time=30)
         except TimeoutException:
-            # check the actual page vs the wanted page
-            main_table = driver.get_element(TABLE_XPATH)
-            page_source = main_table.get_attribute("outerHTML")
-
-            # get current page
-            bs = BeautifulSoup(page_source,'lxml')
-            selected_page = bs.find("ul", {"class": "pagination"}).find("li", {"class": "active"})
-
-            LOGGER.debug(f"Current page: {selected_page}")
-
-            if int(selected_page.text) == new_page:
-                loaded_page = True
-            else:
-                time.sleep(5)
+            # the table may have been updated in place, let the browser check the selected page
+            try:
+                driver.wait_element_text(ACTIVE_PAGE_XPATH, str(new_page), wait_time=5)
+            except TimeoutException:
+                LOGGER.debug(f"Page {new_page} not loaded yet")
                 num_tries += 1
+            else:
+                loaded_page = True
         else:
             loaded_page = True
 